@@ -1,14 +1,45 @@
+import asyncio
 import datetime
+import functools
 import logging.config
 from environs import Env
-from seller import download_stock
 
+import orjson
 import requests
 
-from seller import divide, price_conversion
+from seller import (
+    create_session,
+    divide,
+    download_stock,
+    fetch_in_parallel,
+    prepare_watch_prices,
+    prepare_watch_stocks,
+    update_in_parallel,
+)
 
 logger = logging.getLogger(__file__)
 
+_SESSION = create_session()
+
+_YM_BASE = "https://api.partner.market.yandex.ru/"
+
+
+@functools.lru_cache(maxsize=4)
+def _ym_headers(access_token):
+    """Заголовки запросов к API Яндекс маркета (создаются один раз на ключ)"""
+    return {
+        "Content-Type": "application/json",
+        "Authorization": f"Bearer {access_token}",
+        "Accept": "application/json",
+        "Host": "api.partner.market.yandex.ru",
+    }
+
+
+@functools.lru_cache(maxsize=16)
+def _ym_url(campaign_id, method):
+    """Адрес метода API Яндекс маркета для кампании"""
+    return f"{_YM_BASE}campaigns/{campaign_id}/{method}"
+
 
 def get_product_list(page, campaign_id, access_token):
     """Получить список товаров магазина Яндекс
@@ -42,21 +73,15 @@ def get_product_list(page, campaign_id, access_token):
 
 
 
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
+    headers = _ym_headers(access_token)
     payload = {
         "page_token": page,
         "limit": 200,
     }
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-mapping-entries"
-    response = requests.get(url, headers=headers, params=payload)
+    url = _ym_url(campaign_id, "offer-mapping-entries")
+    response = _SESSION.get(url, headers=headers, params=payload)
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object.get("result")
 
 
@@ -83,18 +108,12 @@ def update_stocks(stocks, campaign_id, access_token):
         access_token (str): API-ключ
     """
 
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
+    headers = _ym_headers(access_token)
     payload = {"skus": stocks}
-    url = endpoint_url + f"campaigns/{campaign_id}/offers/stocks"
-    response = requests.put(url, headers=headers, json=payload)
+    url = _ym_url(campaign_id, "offers/stocks")
+    response = _SESSION.put(url, headers=headers, data=orjson.dumps(payload))
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object
 
 
@@ -112,43 +131,49 @@ def update_price(prices, campaign_id, access_token):
 
         access_token (str): API-ключ
     """
-    endpoint_url = "https://api.partner.market.yandex.ru/"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Accept": "application/json",
-        "Host": "api.partner.market.yandex.ru",
-    }
+    headers = _ym_headers(access_token)
     payload = {"offers": prices}
-    url = endpoint_url + f"campaigns/{campaign_id}/offer-prices/updates"
-    response = requests.post(url, headers=headers, json=payload)
+    url = _ym_url(campaign_id, "offer-prices/updates")
+    response = _SESSION.post(url, headers=headers, data=orjson.dumps(payload))
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object
 
 
-def get_offer_ids(campaign_id, market_token):
-    """Получить артикулы товаров Яндекс маркета
+def iter_offer_ids(campaign_id, market_token):
+    """Перебрать артикулы товаров Яндекс маркета
+
+    Запрашивает товары постранично и отдает артикулы по мере получения,
+    не накапливая полный список товаров.
 
     Args:
         campaign_id (str): Идентификатор кампании и идентификатор магазина
         market_token (str): API-ключ
 
-    Returns:
-        Список артикулов
+    Yields:
+        Артикул товара
     """
     page = ""
-    product_list = []
     while True:
         some_prod = get_product_list(page, campaign_id, market_token)
-        product_list.extend(some_prod.get("offerMappingEntries"))
+        for product in some_prod.get("offerMappingEntries"):
+            yield product.get("offer").get("shopSku")
         page = some_prod.get("paging").get("nextPageToken")
         if not page:
             break
-    offer_ids = []
-    for product in product_list:
-        offer_ids.append(product.get("offer").get("shopSku"))
-    return offer_ids
+
+
+def get_offer_ids(campaign_id, market_token):
+    """Получить артикулы товаров Яндекс маркета
+
+    Args:
+        campaign_id (str): Идентификатор кампании и идентификатор магазина
+        market_token (str): API-ключ
+
+    Returns:
+        Множество артикулов
+    """
+    return set(iter_offer_ids(campaign_id, market_token))
 
 
 def create_stocks(watch_remnants, offer_ids, warehouse_id):
@@ -160,7 +185,7 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
     Если остатки равны "1" или артикла нет в остатках заоситься количество 0
 
     Args:
-        watch_remnants (list): список остатков часов
+        watch_remnants (DataFrame): остатки часов из download_stock
         offer_ids (list): Список артикулов
         warehouse_id (): Идентификатор склада.
 
@@ -174,47 +199,7 @@ def create_stocks(watch_remnants, offer_ids, warehouse_id):
                 "updatedAt": (str) - Дата и время обновления
     """
 
-    # Уберем то, что не загружено в market
-    stocks = list()
-    date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append(
-                {
-                    "sku": str(watch.get("Код")),
-                    "warehouseId": warehouse_id,
-                    "items": [
-                        {
-                            "count": stock,
-                            "type": "FIT",
-                            "updatedAt": date,
-                        }
-                    ],
-                }
-            )
-            offer_ids.remove(str(watch.get("Код")))
-    # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
-        stocks.append(
-            {
-                "sku": offer_id,
-                "warehouseId": warehouse_id,
-                "items": [
-                    {
-                        "count": 0,
-                        "type": "FIT",
-                        "updatedAt": date,
-                    }
-                ],
-            }
-        )
+    stocks, _ = build_stocks(watch_remnants, offer_ids, warehouse_id)
     return stocks
 
 
@@ -223,7 +208,7 @@ def create_prices(watch_remnants, offer_ids):
     Выставляются цены на часы по их артиклу
 
     Args:
-        watch_remnants (list): Список часов
+        watch_remnants (DataFrame): остатки часов из download_stock
         offer_ids (list): Список артикулов
 
     Returns:
@@ -236,24 +221,110 @@ def create_prices(watch_remnants, offer_ids):
     """
 
     prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "id": str(watch.get("Код")),
-                # "feed": {"id": 0},
-                "price": {
-                    "value": int(price_conversion(watch.get("Цена"))),
-                    # "discountBase": 0,
-                    "currencyId": "RUR",
-                    # "vat": 0,
-                },
-                # "marketSku": 0,
-                # "shopSku": "string",
-            }
-            prices.append(price)
+    for watch in prepare_watch_prices(watch_remnants, offer_ids):
+        price = {
+            "id": watch["Код"],
+            # "feed": {"id": 0},
+            "price": {
+                "value": watch["Цена в рублях"],
+                # "discountBase": 0,
+                "currencyId": "RUR",
+                # "vat": 0,
+            },
+            # "marketSku": 0,
+            # "shopSku": "string",
+        }
+        prices.append(price)
     return prices
 
 
+def build_stocks(watch_remnants, offer_ids, warehouse_id):
+    """Создать список склада и список товаров в наличии
+
+    Формирует список склада в формате create_stocks и одновременно
+    собирает товары с ненулевым остатком. Цены не разбираются.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
+        warehouse_id (): Идентификатор склада.
+
+    Returns:
+        Кортеж из списка склада и списка товаров в наличии
+        (ненулевой остаток)
+    """
+
+    # Уберем то, что не загружено в market
+    offer_ids = set(offer_ids)
+    missing = set(offer_ids)
+    stocks = list()
+    not_empty = []
+    stocks_append = stocks.append
+    not_empty_append = not_empty.append
+    missing_discard = missing.discard
+    date = str(datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z")
+    # download_stock читает столбцы с dtype=str, поэтому "Код" уже строка
+    for watch in prepare_watch_stocks(watch_remnants, offer_ids):
+        code = watch["Код"]
+        if code in missing:
+            count = watch["Количество"]
+            stock = {
+                "sku": code,
+                "warehouseId": warehouse_id,
+                "items": [
+                    {
+                        "count": count,
+                        "type": "FIT",
+                        "updatedAt": date,
+                    }
+                ],
+            }
+            stocks_append(stock)
+            if count != 0:
+                not_empty_append(stock)
+            missing_discard(code)
+    # Добавим недостающее из загруженного.
+    # Список items у всех таких товаров общий: он только сериализуется в JSON
+    zero_items = [
+        {
+            "count": 0,
+            "type": "FIT",
+            "updatedAt": date,
+        }
+    ]
+    for offer_id in missing:
+        stocks_append(
+            {
+                "sku": offer_id,
+                "warehouseId": warehouse_id,
+                "items": zero_items,
+            }
+        )
+    return stocks, not_empty
+
+
+def build_stocks_and_prices(watch_remnants, offer_ids, warehouse_id):
+    """Создать список склада и список цен
+
+    Формирует оба списка в формате create_stocks и create_prices.
+    Количество и цена разбираются независимо: некорректная цена
+    не мешает созданию списка склада, и наоборот.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
+        warehouse_id (): Идентификатор склада.
+
+    Returns:
+        Кортеж из списка склада, списка товаров в наличии
+        (ненулевой остаток) и списка цен
+    """
+
+    stocks, not_empty = build_stocks(watch_remnants, offer_ids, warehouse_id)
+    prices = create_prices(watch_remnants, offer_ids)
+    return stocks, not_empty, prices
+
+
 async def upload_prices(watch_remnants, campaign_id, market_token):
     """
     Обновляет цены товаров Яндекс маркета
@@ -263,7 +334,7 @@ async def upload_prices(watch_remnants, campaign_id, market_token):
     обновляет цены товаров на  Яндекс маркете
 
     Args:
-        watch_remnants (): Список часов casio
+        watch_remnants (DataFrame): остатки часов casio из download_stock
         campaign_id (str): Идентификатор кампании и идентификатор магазина
         market_token (str): API-ключ
 
@@ -278,8 +349,9 @@ async def upload_prices(watch_remnants, campaign_id, market_token):
 
     offer_ids = get_offer_ids(campaign_id, market_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_prices in list(divide(prices, 500)):
-        update_price(some_prices, campaign_id, market_token)
+    await update_in_parallel(
+        update_price, divide(prices, 500), campaign_id, market_token
+    )
     return prices
 
 
@@ -292,7 +364,7 @@ async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id)
     обновляет количество товаров на  Яндекс маркете
 
     Args:
-        watch_remnants (): Список часов casio
+        watch_remnants (DataFrame): остатки часов casio из download_stock
         campaign_id (str): Идентификатор кампании и идентификатор магазина
         market_token (str): API-ключ
         warehouse_id (): Идентификатор склада.
@@ -311,16 +383,14 @@ async def upload_stocks(watch_remnants, campaign_id, market_token, warehouse_id)
     """
 
     offer_ids = get_offer_ids(campaign_id, market_token)
-    stocks = create_stocks(watch_remnants, offer_ids, warehouse_id)
-    for some_stock in list(divide(stocks, 2000)):
-        update_stocks(some_stock, campaign_id, market_token)
-    not_empty = list(
-        filter(lambda stock: (stock.get("items")[0].get("count") != 0), stocks)
+    stocks, not_empty = build_stocks(watch_remnants, offer_ids, warehouse_id)
+    await update_in_parallel(
+        update_stocks, divide(stocks, 2000), campaign_id, market_token
     )
     return not_empty, stocks
 
 
-def main():
+async def main():
     env = Env()
     market_token = env.str("MARKET_TOKEN")
     campaign_fbs_id = env.str("FBS_ID")
@@ -328,25 +398,37 @@ def main():
     warehouse_fbs_id = env.str("WAREHOUSE_FBS_ID")
     warehouse_dbs_id = env.str("WAREHOUSE_DBS_ID")
 
-    watch_remnants = download_stock()
     try:
+        # Остатки и артикулы FBS и DBS скачиваются одновременно
+        watch_remnants, fbs_offer_ids, dbs_offer_ids = await fetch_in_parallel(
+            (download_stock,),
+            (get_offer_ids, campaign_fbs_id, market_token),
+            (get_offer_ids, campaign_dbs_id, market_token),
+        )
+
         # FBS
-        offer_ids = get_offer_ids(campaign_fbs_id, market_token)
         # Обновить остатки FBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_fbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_fbs_id, market_token)
+        stocks = create_stocks(watch_remnants, fbs_offer_ids, warehouse_fbs_id)
+        await update_in_parallel(
+            update_stocks, divide(stocks, 2000), campaign_fbs_id, market_token
+        )
         # Поменять цены FBS
-        upload_prices(watch_remnants, campaign_fbs_id, market_token)
+        prices = create_prices(watch_remnants, fbs_offer_ids)
+        await update_in_parallel(
+            update_price, divide(prices, 500), campaign_fbs_id, market_token
+        )
 
         # DBS
-        offer_ids = get_offer_ids(campaign_dbs_id, market_token)
         # Обновить остатки DBS
-        stocks = create_stocks(watch_remnants, offer_ids, warehouse_dbs_id)
-        for some_stock in list(divide(stocks, 2000)):
-            update_stocks(some_stock, campaign_dbs_id, market_token)
+        stocks = create_stocks(watch_remnants, dbs_offer_ids, warehouse_dbs_id)
+        await update_in_parallel(
+            update_stocks, divide(stocks, 2000), campaign_dbs_id, market_token
+        )
         # Поменять цены DBS
-        upload_prices(watch_remnants, campaign_dbs_id, market_token)
+        prices = create_prices(watch_remnants, dbs_offer_ids)
+        await update_in_parallel(
+            update_price, divide(prices, 500), campaign_dbs_id, market_token
+        )
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
     except requests.exceptions.ConnectionError as error:
@@ -356,4 +438,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
@@ -1,15 +1,66 @@
+import asyncio
+import functools
 import io
 import logging.config
-import os
 import re
 import zipfile
 from environs import Env
 
+import orjson
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 logger = logging.getLogger(__file__)
 
+_NON_DIGITS = re.compile("[^0-9]")
+
+# Количество в остатках casio, которое заменяется фиксированным значением
+_COUNT_MAP = {">10": 100, "1": 0}
+
+
+def create_session():
+    """Создать HTTP-сессию
+
+    Сессия переиспользует соединения (keep-alive) между запросами,
+    повторяет запрос при ответах 429 и 5xx и запрашивает сжатие gzip.
+    Повторяются и POST-запросы: импорт цен и остатков и список товаров
+    Озона, а также обновление цен Яндекс маркета (offer-prices/updates)
+    идемпотентны, повторная отправка дает тот же результат.
+
+    Returns:
+        requests.Session
+    """
+
+    retries = Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=["GET", "PUT", "POST"],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=retries)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.headers.update({"Accept-Encoding": "gzip"})
+    return session
+
+
+_SESSION = create_session()
+
+_OZON_BASE = "https://api-seller.ozon.ru/"
+
+
+@functools.lru_cache(maxsize=4)
+def _ozon_headers(client_id, seller_token):
+    """Заголовки запросов к API Озона (создаются один раз на ключ)"""
+    return {
+        "Client-Id": client_id,
+        "Api-Key": seller_token,
+        "Content-Type": "application/json",
+    }
+
 
 def get_product_list(last_id, client_id, seller_token):
     """Получить список товаров магазина озон
@@ -35,11 +86,8 @@ def get_product_list(last_id, client_id, seller_token):
 
     """
 
-    url = "https://api-seller.ozon.ru/v2/product/list"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = _OZON_BASE + "v2/product/list"
+    headers = _ozon_headers(client_id, seller_token)
     payload = {
         "filter": {
             "visibility": "ALL",
@@ -47,36 +95,52 @@ def get_product_list(last_id, client_id, seller_token):
         "last_id": last_id,
         "limit": 1000,
     }
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    response_object = response.json()
+    response_object = orjson.loads(response.content)
     return response_object.get("result")
 
 
-def get_offer_ids(client_id, seller_token):
-    """Получить артикулы товаров магазина озон
+def iter_offer_ids(client_id, seller_token):
+    """Перебрать артикулы товаров магазина озон
+
+    Запрашивает товары постранично и отдает артикулы по мере получения,
+    не накапливая полный список товаров.
 
     Args:
         client_id (str): Идентификатор клиента
         seller_token (str): API-ключ
 
-    Returns:
-        Список артикулов
+    Yields:
+        Артикул товара
     """
 
     last_id = ""
-    product_list = []
+    received = 0
     while True:
         some_prod = get_product_list(last_id, client_id, seller_token)
-        product_list.extend(some_prod.get("items"))
+        items = some_prod.get("items")
+        for product in items:
+            yield product.get("offer_id")
+        received += len(items)
         total = some_prod.get("total")
         last_id = some_prod.get("last_id")
-        if total == len(product_list):
+        if total == received:
             break
-    offer_ids = []
-    for product in product_list:
-        offer_ids.append(product.get("offer_id"))
-    return offer_ids
+
+
+def get_offer_ids(client_id, seller_token):
+    """Получить артикулы товаров магазина озон
+
+    Args:
+        client_id (str): Идентификатор клиента
+        seller_token (str): API-ключ
+
+    Returns:
+        Множество артикулов
+    """
+
+    return set(iter_offer_ids(client_id, seller_token))
 
 
 def update_price(prices: list, client_id, seller_token):
@@ -104,15 +168,12 @@ def update_price(prices: list, client_id, seller_token):
             "message" (str): Описание ошибки.
     """
 
-    url = "https://api-seller.ozon.ru/v1/product/import/prices"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = _OZON_BASE + "v1/product/import/prices"
+    headers = _ozon_headers(client_id, seller_token)
     payload = {"prices": prices}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
 
 
 def update_stocks(stocks: list, client_id, seller_token):
@@ -138,15 +199,12 @@ def update_stocks(stocks: list, client_id, seller_token):
             "message" (str): Описание ошибки.
     """
 
-    url = "https://api-seller.ozon.ru/v1/product/import/stocks"
-    headers = {
-        "Client-Id": client_id,
-        "Api-Key": seller_token,
-    }
+    url = _OZON_BASE + "v1/product/import/stocks"
+    headers = _ozon_headers(client_id, seller_token)
     payload = {"stocks": stocks}
-    response = requests.post(url, json=payload, headers=headers)
+    response = _SESSION.post(url, data=orjson.dumps(payload), headers=headers)
     response.raise_for_status()
-    return response.json()
+    return orjson.loads(response.content)
 
 
 def download_stock():
@@ -156,35 +214,110 @@ def download_stock():
     https://timeworld.ru в zip архиве 
     и создает список остатков часов.
     
+    Читаются только нужные столбцы, все значения строкового типа.
+
     Returns:
-        Список словарей:
-            'Код': Код товара (68122), 
-            'Наименование товара': Наименование ('BA-110-4A1'), 
-            'Изображение': ('Показать'), 
-            'Цена': Цена товара ("16'590.00 руб."), 
-            'Количество': Количество товара ('>10'), 
-            'Заказ': ''
+        DataFrame со столбцами:
+            'Код': Код товара ('68122'),
+            'Количество': Количество товара ('>10'),
+            'Цена': Цена товара ("16'590.00 руб.")
     """
 
     # Скачать остатки с сайта
     casio_url = "https://timeworld.ru/upload/files/ostatki.zip"
-    session = requests.Session()
-    response = session.get(casio_url)
+    response = _SESSION.get(casio_url)
     response.raise_for_status()
+    # Создаем список остатков часов, не распаковывая архив на диск:
     with response, zipfile.ZipFile(io.BytesIO(response.content)) as archive:
-        archive.extractall(".")
-    # Создаем список остатков часов:
-    excel_file = "ostatki.xls"
-    watch_remnants = pd.read_excel(
-        io=excel_file,
-        na_values=None,
-        keep_default_na=False,
-        header=17,
-    ).to_dict(orient="records")
-    os.remove("./ostatki.xls")  # Удалить файл
+        with archive.open("ostatki.xls") as excel_file:
+            watch_remnants = pd.read_excel(
+                io=excel_file,
+                na_values=None,
+                keep_default_na=False,
+                header=17,
+                usecols=["Код", "Количество", "Цена"],
+                dtype=str,
+                engine="calamine",
+            )
     return watch_remnants
 
 
+def prepare_watch_stocks(watch_remnants, offer_ids):
+    """Подготовить остатки часов для списка склада
+
+    Оставляет только часы, артикулы которых есть в offer_ids,
+    и преобразует количество сразу для всего столбца:
+    количество ">10" заменяется на 100, "1" на 0,
+    остальные значения приводятся к целому числу.
+
+    Строки вне каталога (заголовки групп, пустые строки) не разбираются.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
+
+    Returns:
+        Список словарей:
+            'Код': Код товара ('68122'),
+            'Количество': Количество товара (100)
+    """
+
+    watch_remnants = watch_remnants[watch_remnants["Код"].isin(offer_ids)]
+    counts = watch_remnants["Количество"]
+    stocks = counts.map(_COUNT_MAP)
+    unknown = stocks.isna()
+    stocks[unknown] = counts[unknown].astype(int)
+    return pd.DataFrame(
+        {"Код": watch_remnants["Код"], "Количество": stocks.astype(int)}
+    ).to_dict(orient="records")
+
+
+def prepare_watch_prices(watch_remnants, offer_ids):
+    """Подготовить остатки часов для списка цен
+
+    Оставляет только часы, артикулы которых есть в offer_ids,
+    и преобразует цену сразу для всего столбца: отбрасывает копейки
+    и удаляет все лишние символы (5'990.00 руб. -> 5990).
+
+    Часы, цену которых не удалось разобрать ("по запросу"),
+    пропускаются и записываются в лог.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
+
+    Returns:
+        Список словарей:
+            'Код': Код товара ('68122'),
+            'Цена': Цена товара строкой ('16590'),
+            'Цена в рублях': Цена товара числом (16590)
+    """
+
+    watch_remnants = watch_remnants[watch_remnants["Код"].isin(offer_ids)]
+    codes = watch_remnants["Код"]
+    prices = (
+        watch_remnants["Цена"]
+        .str.split(".", n=1)
+        .str[0]
+        .str.replace(_NON_DIGITS, "", regex=True)
+    )
+    values = pd.to_numeric(prices, errors="coerce")
+    invalid = values.isna()
+    if invalid.any():
+        logger.warning(
+            "Пропущены товары с некорректной ценой: %s",
+            ", ".join(codes[invalid]),
+        )
+    valid = ~invalid
+    return pd.DataFrame(
+        {
+            "Код": codes[valid],
+            "Цена": prices[valid],
+            "Цена в рублях": values[valid].astype(int),
+        }
+    ).to_dict(orient="records")
+
+
 def create_stocks(watch_remnants, offer_ids):
     """ Создает Список склада
 
@@ -194,7 +327,7 @@ def create_stocks(watch_remnants, offer_ids):
     Если остатки равны "1" или артикла нет в остатках заоситься количество 0
 
     Args:
-        watch_remnants (list): список остатков часов
+        watch_remnants (DataFrame): остатки часов из download_stock
         offer_ids (list): Список артикулов
 
     Returns:
@@ -203,24 +336,7 @@ def create_stocks(watch_remnants, offer_ids):
             "stock": Колличиство
     """
 
-    # Уберем то, что не загружено в seller
-
-    stocks = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            count = str(watch.get("Количество"))
-            if count == ">10":
-                stock = 100
-            elif count == "1":
-                stock = 0
-            else:
-                stock = int(watch.get("Количество"))
-            stocks.append({"offer_id": str(watch.get("Код")), "stock": stock})
-            offer_ids.remove(str(watch.get("Код")))
-
-    # Добавим недостающее из загруженного:
-    for offer_id in offer_ids:
-        stocks.append({"offer_id": offer_id, "stock": 0})
+    stocks, _ = build_stocks(watch_remnants, offer_ids)
     return stocks
 
 
@@ -229,7 +345,7 @@ def create_prices(watch_remnants, offer_ids):
     Выставляются цены на часы по их артиклу
 
     Args:
-        watch_remnants (list): Список часов
+        watch_remnants (DataFrame): остатки часов из download_stock
         offer_ids (list): Список артикулов
 
     Returns:
@@ -242,81 +358,180 @@ def create_prices(watch_remnants, offer_ids):
     """
 
     prices = []
-    for watch in watch_remnants:
-        if str(watch.get("Код")) in offer_ids:
-            price = {
-                "auto_action_enabled": "UNKNOWN",
-                "currency_code": "RUB",
-                "offer_id": str(watch.get("Код")),
-                "old_price": "0",
-                "price": price_conversion(watch.get("Цена")),
-            }
-            prices.append(price)
+    for watch in prepare_watch_prices(watch_remnants, offer_ids):
+        price = {
+            "auto_action_enabled": "UNKNOWN",
+            "currency_code": "RUB",
+            "offer_id": watch["Код"],
+            "old_price": "0",
+            "price": watch["Цена"],
+        }
+        prices.append(price)
     return prices
 
 
-def price_conversion(price: str) -> str:
-    """Преобразовать цену. 
+def build_stocks(watch_remnants, offer_ids):
+    """Создать список склада и список товаров в наличии
+
+    Формирует список склада в формате create_stocks и одновременно
+    собирает товары с ненулевым остатком. Цены не разбираются.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
+
+    Returns:
+        Кортеж из списка склада и списка товаров в наличии
+        (ненулевой остаток)
+    """
+
+    # Уберем то, что не загружено в seller
+    offer_ids = set(offer_ids)
+    missing = set(offer_ids)
+    stocks = []
+    not_empty = []
+    stocks_append = stocks.append
+    not_empty_append = not_empty.append
+    missing_discard = missing.discard
+    # download_stock читает столбцы с dtype=str, поэтому "Код" уже строка
+    for watch in prepare_watch_stocks(watch_remnants, offer_ids):
+        code = watch["Код"]
+        if code in missing:
+            count = watch["Количество"]
+            stock = {"offer_id": code, "stock": count}
+            stocks_append(stock)
+            if count != 0:
+                not_empty_append(stock)
+            missing_discard(code)
+
+    # Добавим недостающее из загруженного:
+    for offer_id in missing:
+        stocks_append({"offer_id": offer_id, "stock": 0})
+    return stocks, not_empty
+
+
+def build_stocks_and_prices(watch_remnants, offer_ids):
+    """Создать список склада и список цен
 
-    Удаляет из строки цена все лишние символы,
-    возвращает целое число строкового типа
+    Формирует оба списка в формате create_stocks и create_prices.
+    Количество и цена разбираются независимо: некорректная цена
+    не мешает созданию списка склада, и наоборот.
+
+    Args:
+        watch_remnants (DataFrame): остатки часов из download_stock
+        offer_ids (list): Список артикулов
 
-    Пример: 5'990.00 руб. -> 5990"""
+    Returns:
+        Кортеж из списка склада, списка товаров в наличии
+        (ненулевой остаток) и списка цен
+    """
 
-    return re.sub("[^0-9]", "", price.split(".")[0])
+    stocks, not_empty = build_stocks(watch_remnants, offer_ids)
+    prices = create_prices(watch_remnants, offer_ids)
+    return stocks, not_empty, prices
 
 
 def divide(lst: list, n: int):
     """Разделить список lst на части по n элементов
 
+    Части отдаются по одной, поэтому результат можно перебирать
+    в цикле или передать в update_in_parallel без list(...).
+
     Пример: 
-    >>> print(divide(range(1, 16), 6))
+    >>> print(list(divide(list(range(1, 16)), 6)))
     [[1, 2, 3, 4, 5, 6], [7, 8, 9, 10, 11, 12], [13, 14, 15]]
 
     Args:
         lst (list): Список элементов
         n (int): Количество элементов в списке
 
-    Returns:
-        Список из списка по n элементов
+    Yields:
+        Список из n элементов (последний может быть короче)
     """
 
     for i in range(0, len(lst), n):
         yield lst[i : i + n]
 
 
+async def update_in_parallel(update, chunks, *args, limit=8):
+    """Отправить части списка параллельно
+
+    Вызывает update(chunk, *args) для каждой части в отдельном потоке,
+    одновременно выполняется не больше limit запросов.
+
+    Args:
+        update (callable): Функция обновления (update_stocks, update_price)
+        chunks (iterable): Части списка, например из divide
+        *args: Остальные аргументы update
+        limit (int): Максимальное число одновременных запросов
+
+    Returns:
+        Список ответов update в порядке частей
+    """
+
+    semaphore = asyncio.Semaphore(limit)
+
+    async def send(chunk):
+        async with semaphore:
+            return await asyncio.to_thread(update, chunk, *args)
+
+    return await asyncio.gather(*(send(chunk) for chunk in chunks))
+
+
+async def fetch_in_parallel(*calls):
+    """Выполнить независимые запросы параллельно
+
+    Каждый вызов выполняется в отдельном потоке, например
+    fetch_in_parallel((get_offer_ids, client_id, seller_token), (download_stock,))
+
+    Args:
+        *calls: Кортежи из функции и ее аргументов
+
+    Returns:
+        Список результатов в порядке вызовов
+    """
+
+    return await asyncio.gather(*(asyncio.to_thread(*call) for call in calls))
+
+
 async def upload_prices(watch_remnants, client_id, seller_token):
     offer_ids = get_offer_ids(client_id, seller_token)
     prices = create_prices(watch_remnants, offer_ids)
-    for some_price in list(divide(prices, 1000)):
-        update_price(some_price, client_id, seller_token)
+    await update_in_parallel(
+        update_price, divide(prices, 1000), client_id, seller_token
+    )
     return prices
 
 
 async def upload_stocks(watch_remnants, client_id, seller_token):
     offer_ids = get_offer_ids(client_id, seller_token)
-    stocks = create_stocks(watch_remnants, offer_ids)
-    for some_stock in list(divide(stocks, 100)):
-        update_stocks(some_stock, client_id, seller_token)
-    not_empty = list(filter(lambda stock: (stock.get("stock") != 0), stocks))
+    stocks, not_empty = build_stocks(watch_remnants, offer_ids)
+    await update_in_parallel(
+        update_stocks, divide(stocks, 100), client_id, seller_token
+    )
     return not_empty, stocks
 
 
-def main():
+async def main():
     env = Env()
     seller_token = env.str("SELLER_TOKEN")
     client_id = env.str("CLIENT_ID")
     try:
-        offer_ids = get_offer_ids(client_id, seller_token)
-        watch_remnants = download_stock()
+        # Артикулы и остатки скачиваются одновременно
+        offer_ids, watch_remnants = await fetch_in_parallel(
+            (get_offer_ids, client_id, seller_token),
+            (download_stock,),
+        )
         # Обновить остатки
         stocks = create_stocks(watch_remnants, offer_ids)
-        for some_stock in list(divide(stocks, 100)):
-            update_stocks(some_stock, client_id, seller_token)
+        await update_in_parallel(
+            update_stocks, divide(stocks, 100), client_id, seller_token
+        )
         # Поменять цены
         prices = create_prices(watch_remnants, offer_ids)
-        for some_price in list(divide(prices, 900)):
-            update_price(some_price, client_id, seller_token)
+        await update_in_parallel(
+            update_price, divide(prices, 900), client_id, seller_token
+        )
     except requests.exceptions.ReadTimeout:
         print("Превышено время ожидания...")
     except requests.exceptions.ConnectionError as error:
@@ -326,4 +541,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    asyncio.run(main())
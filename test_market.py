@@ -0,0 +1,76 @@
+import pandas as pd
+
+from market import build_stocks_and_prices
+
+
+def make_watch_remnants(rows):
+    return pd.DataFrame(rows, columns=["Код", "Количество", "Цена"], dtype=str)
+
+
+def test_build_stocks_and_prices_shares_items_of_missing_skus():
+    watch_remnants = make_watch_remnants([["68122", "3", "16'590.00 руб."]])
+
+    stocks, _, _ = build_stocks_and_prices(
+        watch_remnants, ["68122", "70001", "99999"], 7
+    )
+
+    missing = [stock for stock in stocks if stock["sku"] != "68122"]
+    assert len(missing) == 2
+    assert missing[0]["items"] is missing[1]["items"]
+    assert missing[0]["items"][0]["count"] == 0
+    in_file = next(stock for stock in stocks if stock["sku"] == "68122")
+    assert in_file["items"] is not missing[0]["items"]
+
+
+def test_build_stocks_and_prices_returns_stocks_not_empty_and_prices():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", ">10", "16'590.00 руб."],
+            ["70001", "1", "5'990.00 руб."],
+        ]
+    )
+
+    result = build_stocks_and_prices(watch_remnants, ["68122", "70001"], 7)
+
+    assert isinstance(result, tuple)
+    stocks, not_empty, prices = result
+    assert {stock["sku"] for stock in stocks} == {"68122", "70001"}
+    assert [stock["sku"] for stock in not_empty] == ["68122"]
+    assert prices == [
+        {"id": "68122", "price": {"value": 16590, "currencyId": "RUR"}},
+        {"id": "70001", "price": {"value": 5990, "currencyId": "RUR"}},
+    ]
+
+
+def test_build_stocks_and_prices_fills_not_empty_while_building():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", "3", "16'590.00 руб."],
+            ["70001", "1", "5'990.00 руб."],
+            ["70002", ">10", "1'990.00 руб."],
+        ]
+    )
+
+    stocks, not_empty, _ = build_stocks_and_prices(
+        watch_remnants, ["68122", "70001", "70002", "99999"], 7
+    )
+
+    assert [stock["sku"] for stock in not_empty] == ["68122", "70002"]
+    assert all(any(stock is built for built in stocks) for stock in not_empty)
+    assert [stock["items"][0]["count"] for stock in not_empty] == [3, 100]
+
+
+def test_build_stocks_and_prices_with_duplicate_rows():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", "3", "16'590.00 руб."],
+            ["68122", "5", "17'990.00 руб."],
+        ]
+    )
+
+    stocks, not_empty, prices = build_stocks_and_prices(watch_remnants, ["68122"], 7)
+
+    assert len(stocks) == 1
+    assert stocks[0]["items"][0]["count"] == 3
+    assert not_empty == stocks
+    assert [price["price"]["value"] for price in prices] == [16590, 17990]
@@ -0,0 +1,83 @@
+import pandas as pd
+
+from seller import (
+    build_stocks_and_prices,
+    create_prices,
+    create_stocks,
+    prepare_watch_prices,
+    prepare_watch_stocks,
+)
+
+
+def make_watch_remnants(rows):
+    return pd.DataFrame(rows, columns=["Код", "Количество", "Цена"], dtype=str)
+
+
+def test_prepare_watch_stocks_skips_rows_outside_catalogue():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", ">10", "16'590.00 руб."],
+            ["", "", ""],
+            ["Часы CASIO", "Количество", "Цена"],
+            ["70001", "3", "5'990.00 руб."],
+        ]
+    )
+
+    prepared = prepare_watch_stocks(watch_remnants, {"68122", "70001"})
+
+    assert prepared == [
+        {"Код": "68122", "Количество": 100},
+        {"Код": "70001", "Количество": 3},
+    ]
+
+
+def test_prepare_watch_prices_skips_unparsable_prices():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", ">10", "16'590.00 руб."],
+            ["", "", ""],
+            ["70001", "3", "по запросу"],
+        ]
+    )
+
+    prepared = prepare_watch_prices(watch_remnants, {"68122", "70001"})
+
+    assert prepared == [{"Код": "68122", "Цена": "16590", "Цена в рублях": 16590}]
+
+
+def test_create_prices_ignores_bad_count():
+    watch_remnants = make_watch_remnants([["68122", "под заказ", "16'590.00 руб."]])
+
+    prices = create_prices(watch_remnants, {"68122"})
+
+    assert [price["price"] for price in prices] == ["16590"]
+
+
+def test_create_stocks_ignores_bad_price():
+    watch_remnants = make_watch_remnants([["68122", ">10", "по запросу"]])
+
+    stocks = create_stocks(watch_remnants, {"68122"})
+
+    assert stocks == [{"offer_id": "68122", "stock": 100}]
+
+
+def test_build_stocks_and_prices_with_junk_row():
+    watch_remnants = make_watch_remnants(
+        [
+            ["68122", ">10", "16'590.00 руб."],
+            ["", "", ""],
+            ["70001", "1", "5'990.00 руб."],
+        ]
+    )
+
+    stocks, not_empty, prices = build_stocks_and_prices(
+        watch_remnants, ["68122", "70001", "99999"]
+    )
+
+    assert sorted(stocks, key=lambda stock: stock["offer_id"]) == [
+        {"offer_id": "68122", "stock": 100},
+        {"offer_id": "70001", "stock": 0},
+        {"offer_id": "99999", "stock": 0},
+    ]
+    assert not_empty == [{"offer_id": "68122", "stock": 100}]
+    assert [price["price"] for price in prices] == ["16590", "5990"]